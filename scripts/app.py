@@ -12,6 +12,14 @@ class TextItem(BaseModel):
 @app.post("/analyze")
 def analyze_text(item: TextItem):
     texte = item.texte
+    if not texte.strip():
+        return {
+            "texte": texte,
+            "language": "unknown",
+            "sentiment": "neutral",
+            "sentiment_scores": {"neg": 0.0, "neu": 1.0, "pos": 0.0, "compound": 0.0},
+            "sentiment_tokens": []
+        }
     lang = detect_language(texte)
     sentiment, scores, tokens = sentiment_vader(sid, texte)
     return {
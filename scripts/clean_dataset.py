@@ -0,0 +1,59 @@
+"""
+clean_dataset.py
+
+Helpers shared by the scripts that write or read the cleaned dataset (preprocess.py, load_to_mongo.py,
+nlp_pipeline.py).
+"""
+from pathlib import Path
+import hashlib
+
+try:
+    import pandas as pd
+except Exception:
+    pd = None
+
+# Optional: pyarrow for Parquet I/O and its multi-threaded CSV parser (pip install pyarrow)
+try:
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+    CSV_READ_OPTS = {"engine": "pyarrow"}
+except Exception:
+    pq = None
+    HAS_PYARROW = False
+    CSV_READ_OPTS = {"low_memory": False}
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+CLEAN_PARQUET = DATA_DIR / "cyberbullying_clean.parquet"
+CLEAN_CSV = DATA_DIR / "cyberbullying_clean.csv"
+COLUMNS = ["id_post", "texte", "Type", "Label", "text_hash"]
+
+
+def text_hash(text: str) -> bytes:
+    """
+    16-byte BLAKE2b digest of `text`, stored as `text_hash`.
+    Dedup in preprocess.py, the unique index and the $merge key all rely on every script computing it this way.
+    """
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def read_clean_dataset(columns=COLUMNS):
+    """
+    Load `columns` of the cleaned dataset, preferring the Parquet output of preprocess.py over the CSV.
+    text_hash always comes back as raw 16-byte digests: hex-decoded from the CSV, or computed from texte
+    for files cleaned before text_hash existed.
+    """
+    if pd is None:
+        raise RuntimeError("pandas not installed. Install with: pip install pandas")
+    if HAS_PYARROW and CLEAN_PARQUET.exists():
+        names = pq.read_schema(CLEAN_PARQUET).names
+        df = pd.read_parquet(CLEAN_PARQUET, columns=[c for c in columns if c in names])
+    elif CLEAN_CSV.exists():
+        df = pd.read_csv(CLEAN_CSV, encoding="utf-8", dtype={"text_hash": str}, **CSV_READ_OPTS)
+        df = df[[c for c in columns if c in df.columns]]
+        if "text_hash" in df.columns:
+            df["text_hash"] = df["text_hash"].map(bytes.fromhex)
+    else:
+        raise FileNotFoundError(f"{CLEAN_PARQUET} / {CLEAN_CSV} not found. Run preprocess.py first.")
+    if "text_hash" in columns and "text_hash" not in df.columns:
+        df["text_hash"] = df["texte"].fillna("").astype(str).map(text_hash)
+    return df
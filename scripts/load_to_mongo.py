@@ -1,22 +1,15 @@
-from pathlib import Path
 import os
+import sys
 import argparse
 
-import pandas as pd
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+
+from clean_dataset import COLUMNS, read_clean_dataset, text_hash
 
-SCRIPT_DIR = Path(__file__).resolve().parent.parent / "data"
-CLEAN_CSV = SCRIPT_DIR / "cyberbullying_clean.csv"
 MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME = os.environ.get("MONGO_DB", "harassment")
 COLLECTION_NAME = os.environ.get("MONGO_COLLECTION", "posts")
-
-
-def load_csv():
-    if not CLEAN_CSV.exists():
-        raise FileNotFoundError(f"{CLEAN_CSV} not found. Run preprocess.py first.")
-    df = pd.read_csv(CLEAN_CSV, encoding="utf-8", low_memory=False)
-    return df
+BULK_BATCH = 1000
 
 
 def connect_mongo(uri):
@@ -30,25 +23,27 @@ def ensure_unique_index(coll, field):
     Remove exact duplicates on `field` (keep first) then create a unique index.
     Safe to call even if duplicates exist.
     """
+    # server-side: one row per surplus _id (every id of a duplicate group except the first)
     pipeline = [
         {"$group": {"_id": f"${field}", "count": {"$sum": 1}, "ids": {"$push": "$_id"}}},
-        {"$match": {"_id": {"$ne": None}, "count": {"$gt": 1}}}
+        {"$match": {"_id": {"$ne": None}, "count": {"$gt": 1}}},
+        {"$project": {"_id": 0, "remove": {"$slice": ["$ids", 1, {"$subtract": ["$count", 1]}]}}},
+        {"$unwind": "$remove"},
     ]
+    removed = 0
     try:
-        duplicates = list(coll.aggregate(pipeline))
+        batch = []
+        for d in coll.aggregate(pipeline, allowDiskUse=True):
+            batch.append(d["remove"])
+            if len(batch) >= BULK_BATCH:
+                removed += coll.delete_many({"_id": {"$in": batch}}).deleted_count
+                batch = []
+        if batch:
+            removed += coll.delete_many({"_id": {"$in": batch}}).deleted_count
     except Exception as e:
-        print(f"Warning: error while detecting duplicates for field '{field}': {e}")
-        duplicates = []
-
-    if duplicates:
-        removed = 0
-        for d in duplicates:
-            ids = d.get("ids", [])
-            keep = ids[0]
-            remove = ids[1:]
-            if remove:
-                res = coll.delete_many({"_id": {"$in": remove}})
-                removed += res.deleted_count
+        print(f"Warning: error while removing duplicates for field '{field}': {e}")
+
+    if removed:
         print(f"Info: {removed} documents removed to deduplicate on '{field}'")
 
     try:
@@ -58,43 +53,132 @@ def ensure_unique_index(coll, field):
         print(f"Warning: could not create unique index on '{field}': {e}")
 
 
-def upsert_records(df, by="texte"):
+def backfill_text_hash(coll):
+    """
+    Set text_hash on documents written without it (by the original loader or by nlp_pipeline.py).
+    Otherwise they all collide on a null key and the unique text_hash index cannot be built.
+    """
+    filled = 0
+    ops = []
+    for d in coll.find({"text_hash": {"$exists": False}}, {"texte": 1}):
+        texte = "" if d.get("texte") is None else str(d["texte"])
+        ops.append(UpdateOne({"_id": d["_id"]}, {"$set": {"text_hash": text_hash(texte)}}))
+        if len(ops) >= BULK_BATCH:
+            filled += coll.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        filled += coll.bulk_write(ops, ordered=False).modified_count
+    if filled:
+        print(f"Info: text_hash backfilled on {filled} existing documents")
+
+
+def drop_plain_index(coll, field):
+    """Drop a non-unique single-field index on `field`, so a unique one can be created in its place."""
+    for name, info in coll.index_information().items():
+        if info.get("key") == [(field, 1)] and not info.get("unique"):
+            coll.drop_index(name)
+
+
+def id_post_conflicts(stage, by, limit=5):
+    """
+    Staged id_post values already held by a target document with a different `by` key. Merging
+    those would violate the unique id_post index (e.g. after preprocess renumbered the rows).
+    """
+    return [d["id_post"] for d in stage.aggregate([
+        {"$lookup": {"from": COLLECTION_NAME, "localField": "id_post", "foreignField": "id_post",
+                     "as": "existing"}},
+        {"$unwind": "$existing"},
+        {"$match": {"$expr": {"$ne": [f"$existing.{by}", f"${by}"]}}},
+        {"$project": {"_id": 0, "id_post": 1}},
+        {"$limit": limit},
+    ])]
+
+
+def when_matched(by):
+    """
+    $merge whenMatched for key `by`. Keyed on the text (text_hash / texte), the text is unchanged, so the
+    existing document is merged and its NLP fields kept. Keyed on id_post, the text may have changed (e.g.
+    after preprocess renumbered the rows): the document is replaced, as replace_one did, unless text_hash is
+    the same, so stale language / sentiment fields are dropped and nlp_pipeline.py recomputes them.
+    """
+    if by != "id_post":
+        return "merge"
+    return [{"$replaceWith": {"$cond": [
+        {"$eq": ["$text_hash", "$$new.text_hash"]},
+        {"$mergeObjects": ["$$ROOT", "$$new"]},
+        {"$mergeObjects": [{"_id": "$_id"}, "$$new"]},
+    ]}}]
+
+
+def upsert_records(df, by="text_hash"):
+    """
+    Upsert all rows in two round-trips: insert_many into a staging collection, then one server-side
+    $merge into the target keyed on `by` (see when_matched for what happens to existing documents).
+
+    Unlike a per-document loop, one bad row aborts the whole load: id_post clashes are checked up
+    front and stop it before anything is written, but any other error during the $merge (which is
+    not transactional) stops it part-way, keeping the documents merged so far. Either way the error
+    is reported and the process exits non-zero; re-running the load is safe.
+    """
     client = connect_mongo(MONGO_URI)
     db = client[DB_NAME]
     coll = db[COLLECTION_NAME]
 
+    backfill_text_hash(coll)
     ensure_unique_index(coll, "id_post")
-    try:
-        coll.create_index([("texte", 1)])
-    except Exception:
-        pass
-
-    records = df[["id_post", "texte", "Type", "Label"]].to_dict(orient="records")
-    count = 0
+    if by == "id_post":
+        try:
+            coll.create_index([("text_hash", 1)])
+        except Exception:
+            pass
+    else:
+        # $merge's "on" field must be backed by a unique index
+        drop_plain_index(coll, by)
+        ensure_unique_index(coll, by)
+
+    records = df[COLUMNS].to_dict(orient="records")
     for r in records:
-        key = {by: r.get(by)}
-        if by == "id_post" and key.get("id_post") is not None:
+        if r.get("id_post") is not None:
             try:
-                key["id_post"] = int(key["id_post"])
+                r["id_post"] = int(r["id_post"])
             except Exception:
                 pass
-        try:
-            coll.replace_one(key, r, upsert=True)
-            count += 1
-        except Exception as e:
-            print(f"Error upserting key {key}: {e}")
 
-    print(f"Success: {count} documents upserted into {DB_NAME}.{COLLECTION_NAME} (MONGO_URI={MONGO_URI})")
-    client.close()
+    stage = db[f"{COLLECTION_NAME}_stage"]
+    stage.drop()
+    try:
+        if records:
+            stage.insert_many(records, ordered=False)
+            if by != "id_post":
+                conflicts = id_post_conflicts(stage, by)
+                if conflicts:
+                    print(f"Error: id_post values already used by other documents in {DB_NAME}.{COLLECTION_NAME} "
+                          f"(e.g. {conflicts}); nothing was merged. Reload with --by id_post or clear the collection.")
+                    sys.exit(1)
+            stage.aggregate([
+                {"$project": {"_id": 0}},
+                {"$merge": {"into": COLLECTION_NAME, "on": by,
+                            "whenMatched": when_matched(by), "whenNotMatched": "insert"}},
+            ])
+    except Exception as e:
+        print(f"Error: merge into {DB_NAME}.{COLLECTION_NAME} failed, load aborted "
+              f"(documents merged before the error are kept): {e}")
+        sys.exit(1)
+    finally:
+        stage.drop()
+        client.close()
+
+    # a completed $merge has inserted or updated every staged record
+    print(f"Success: {len(records)} documents upserted into {DB_NAME}.{COLLECTION_NAME} (MONGO_URI={MONGO_URI})")
 
 
 def main():
-    parser = argparse.ArgumentParser(description="Load cyberbullying_clean.csv into MongoDB")
-    parser.add_argument("--by", choices=["texte", "id_post"], default="texte",
-                        help="upsert key: 'texte' (default) or 'id_post'")
+    parser = argparse.ArgumentParser(description="Load cyberbullying_clean.parquet (or .csv) into MongoDB")
+    parser.add_argument("--by", choices=["text_hash", "texte", "id_post"], default="text_hash",
+                        help="upsert key: 'text_hash' (default, 16-byte hash of texte), 'texte' or 'id_post'")
     args = parser.parse_args()
 
-    df = load_csv()
+    df = read_clean_dataset()
     upsert_records(df, by=args.by)
 
 
@@ -14,17 +14,24 @@ ES_HOST = os.environ.get("ES_HOST", "http://localhost:9200")
 ES_USER = os.environ.get("ES_USER", "elastic")
 ES_PASS = os.environ.get("ES_PASS", "changeme123")
 INDEX_NAME = os.environ.get("ES_INDEX", "harcelement_posts")
+BULK_THREADS = int(os.environ.get("ES_BULK_THREADS", "8"))
+
+# Only the fields gen_actions reads are fetched from Mongo
+PROJECTION = {"_id": 1, "id_post": 1, "titre": 1, "texte": 1, "language": 1, "Type": 1,
+              "sentiment": 1, "sentiment_scores.compound": 1, "date": 1}
 
 # Connect
 mongo_client = MongoClient(MONGO_URI)
 db = mongo_client[MONGO_DB]
 collection = db[MONGO_COLL]
 
-# Elasticsearch using basic_auth (http_auth is deprecated)
-es = Elasticsearch(ES_HOST, basic_auth=(ES_USER, ES_PASS))
+# Elasticsearch using basic_auth (http_auth is deprecated); gzip request bodies and keep a
+# connection per bulk thread so parallel_bulk reuses sockets instead of reconnecting
+es = Elasticsearch(ES_HOST, basic_auth=(ES_USER, ES_PASS), http_compress=True,
+                   connections_per_node=max(BULK_THREADS, 10), request_timeout=60, retry_on_timeout=True)
 
 def gen_actions():
-    for doc in collection.find():
+    for doc in collection.find({}, projection=PROJECTION).batch_size(2000):
         yield {
             "_index": INDEX_NAME,
             "_id": str(doc.get("id_post") or doc.get("_id")),
@@ -68,11 +75,35 @@ if __name__ == "__main__":
     except Exception as e:
         print("Warning: could not create index:", e)
 
+    # pause refresh and replicas during the load (one refresh at the end instead of one per bulk)
+    restore = None
+    try:
+        current = es.indices.get_settings(index=INDEX_NAME)[INDEX_NAME]["settings"]["index"]
+        restore = {"refresh_interval": current.get("refresh_interval"),
+                   "number_of_replicas": current.get("number_of_replicas", "1")}
+        es.indices.put_settings(index=INDEX_NAME, settings={"refresh_interval": "-1", "number_of_replicas": 0})
+    except Exception as e:
+        print("Warning: could not relax index settings for bulk load:", e)
+
     try:
-        success, errors = helpers.bulk(es, gen_actions(), chunk_size=500, request_timeout=60)
+        success, errors = 0, []
+        for ok, resp in helpers.parallel_bulk(es, gen_actions(), thread_count=BULK_THREADS, chunk_size=500,
+                                              queue_size=BULK_THREADS, raise_on_error=False,
+                                              request_timeout=60):
+            if ok:
+                success += 1
+            else:
+                errors.append(resp)
         print("Documents imported:", success)
         if errors:
             print("Sample errors:", errors[:3])
     except Exception as e:
         print("Bulk import failed:", e)
         sys.exit(1)
+    finally:
+        if restore is not None:
+            try:
+                es.indices.put_settings(index=INDEX_NAME, settings=restore)
+                es.indices.refresh(index=INDEX_NAME)
+            except Exception as e:
+                print("Warning: could not restore index settings:", e)
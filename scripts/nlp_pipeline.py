@@ -3,26 +3,44 @@ nlp_pipeline.py
 
 Purpose:
  - Detect language and analyze sentiment for documents stored in MongoDB (harassment.posts)
- - Or process the cleaned CSV (data/cyberbullying_clean.csv) and optionally upsert results to MongoDB
+ - Or process the cleaned dataset (data/cyberbullying_clean.parquet, or .csv) and optionally upsert results to MongoDB
 
 Usage:
   python3 scripts/nlp_pipeline.py                # process MongoDB (default)
   python3 scripts/nlp_pipeline.py --source csv   # process CSV and upsert results
   python3 scripts/nlp_pipeline.py --force        # recompute even if fields exist
   python3 scripts/nlp_pipeline.py --sample 100   # process only 100 docs (for testing)
+  python3 scripts/nlp_pipeline.py --source csv --workers 4   # score the CSV on 4 processes
 """
-from pathlib import Path
 import os
 import argparse
+import heapq
 import logging
+import random
+import string
+from collections import Counter
+from functools import lru_cache
+from multiprocessing import Pool
 from typing import Dict, Any, List
 
 # Optional deps
 try:
     from langdetect import detect, LangDetectException
+    from langdetect import detector_factory
+    from langdetect.detector_factory import DetectorFactory, PROFILES_DIRECTORY
+    # langdetect is randomized; a fixed seed makes results reproducible across runs and workers
+    DetectorFactory.seed = 0
 except Exception:
     detect = None
     LangDetectException = Exception
+    detector_factory = None
+
+# Optional: fastText language ID (pip install fasttext-wheel), used instead of langdetect when
+# FASTTEXT_LID_MODEL points to lid.176.bin / lid.176.ftz
+try:
+    import fasttext
+except Exception:
+    fasttext = None
 
 try:
     import nltk
@@ -32,27 +50,99 @@ except Exception:
     SentimentIntensityAnalyzer = None
 
 try:
+    import numpy as np
     import pandas as pd
 except Exception:
+    np = None
     pd = None
 
+# run as a script (scripts/ on sys.path) or imported as scripts.nlp_pipeline (app.py)
 try:
-    from pymongo import MongoClient
+    from clean_dataset import read_clean_dataset, text_hash
+except ImportError:
+    from scripts.clean_dataset import read_clean_dataset, text_hash
+
+try:
+    from pymongo import MongoClient, UpdateOne
+    from pymongo.errors import BulkWriteError
 except Exception:
     MongoClient = None
+    UpdateOne = None
+    BulkWriteError = Exception
 
 # Config
-SCRIPT_DIR = Path(__file__).resolve().parent.parent / "data"
-CLEAN_CSV = SCRIPT_DIR / "cyberbullying_clean.csv"
-
 MONGO_URI = os.environ.get("MONGO_URI", "mongodb://localhost:27017")
 MONGO_DB = os.environ.get("MONGO_DB", "harassment")
 MONGO_COLL = os.environ.get("MONGO_COLLECTION", "posts")
+BULK_BATCH = 1000
+
+# VADER compound thresholds for positive / negative labels
+POS_THRESHOLD = 0.05
+NEG_THRESHOLD = -0.05
+
+# Texts shorter than this get the batch-majority language instead of a (slow, unreliable) detect()
+SHORT_TEXT_LEN = 40
+
+# Below this many distinct texts, scoring stays in-process: starting a pool costs more than it saves
+POOL_MIN_TEXTS = 2000
+
+FASTTEXT_LID_MODEL = os.environ.get("FASTTEXT_LID_MODEL", "")
+
+# langdetect profiles to load (comma-separated codes); empty string loads all 55 bundled profiles
+LANGDETECT_LANGS = [l.strip() for l in os.environ.get("LANGDETECT_LANGS", "en,fr,es,de,pt,it,ar").split(",")
+                    if l.strip()]
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger("nlp_pipeline")
 
 
+def _install_langdetect_profiles(langs: List[str]):
+    """
+    Replace langdetect's global factory with one holding only `langs`.
+    Fewer n-gram profiles means less resident memory per process and less scoring work per detect().
+    """
+    if detector_factory is None or not langs:
+        return
+    profiles = []
+    for lang in langs:
+        path = os.path.join(PROFILES_DIRECTORY, lang)
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                profiles.append(f.read())
+    if len(profiles) < 2:
+        # langdetect needs at least two profiles; keep its default full load
+        logger.warning(f"Ignoring LANGDETECT_LANGS={langs}: fewer than 2 known profiles")
+        return
+    factory = DetectorFactory()
+    factory.load_json_profile(profiles)
+    detector_factory._factory = factory
+
+
+def _load_fasttext_model(path: str):
+    if not path:
+        return None
+    if fasttext is None:
+        logger.warning("FASTTEXT_LID_MODEL is set but fasttext is not installed; using langdetect.")
+        return None
+    if not os.path.isfile(path):
+        logger.warning(f"fastText model {path} not found; using langdetect.")
+        return None
+    return fasttext.load_model(path)
+
+
+# Models are loaded on first use rather than at import: spawned / forkserver pool workers re-import this
+# module, and workers that only run VADER should not pay for profiles or a fastText model they never use.
+@lru_cache(maxsize=None)
+def _langdetect_ready() -> bool:
+    _install_langdetect_profiles(LANGDETECT_LANGS)
+    return detect is not None
+
+
+@lru_cache(maxsize=None)
+def _lid():
+    return _load_fasttext_model(FASTTEXT_LID_MODEL)
+
+
 def ensure_nlp_resources():
     if nltk is None or SentimentIntensityAnalyzer is None:
         raise RuntimeError("nltk not installed. Install with: pip install nltk")
@@ -63,12 +153,21 @@ def ensure_nlp_resources():
     return SentimentIntensityAnalyzer()
 
 
+@lru_cache(maxsize=200_000)
 def detect_language(text: str) -> str:
-    if detect is None:
+    if not text or not str(text).strip():
+        return "unknown"
+    if _lid() is not None:
+        # a fastText failure is a setup problem (model, numpy version), not an undetectable text:
+        # log and raise instead of silently writing "unknown" everywhere
+        try:
+            return detect_languages_batch([str(text)])[0]
+        except Exception:
+            logger.exception("fastText language detection failed")
+            raise
+    if not _langdetect_ready():
         return "unknown"
     try:
-        if not text or not str(text).strip():
-            return "unknown"
         return detect(text)
     except LangDetectException:
         return "unknown"
@@ -76,34 +175,142 @@ def detect_language(text: str) -> str:
         return "unknown"
 
 
-def sentiment_vader(sid, text: str):
+def detect_languages_batch(texts: List[str]) -> List[str]:
+    """
+    fastText language IDs for all `texts` in a single predict() call ('unknown' for empty texts).
+    Always uses the list form of predict(): the single-string form fails with numpy >= 2.
+    """
+    if not texts:
+        return []
+    labels, _ = _lid().predict([t.replace("\n", " ") for t in texts], k=1)
+    return [l[0].replace("__label__", "") if t.strip() and len(l) else "unknown" for t, l in zip(texts, labels)]
+
+
+def majority_language(texts: List[str], sample: int = 500, seed: int = 0):
+    """Most common language detected on a random sample of texts long enough to detect reliably."""
+    long_texts = [t for t in texts if len(t) >= SHORT_TEXT_LEN]
+    if not long_texts:
+        return None
+    picked = random.Random(seed).sample(long_texts, min(sample, len(long_texts)))
+    counts = Counter(detect_language(t) for t in picked)
+    counts.pop("unknown", None)
+    return counts.most_common(1)[0][0] if counts else None
+
+
+def sentiment_label(compound: float) -> str:
+    if compound >= POS_THRESHOLD:
+        return "positive"
+    if compound <= NEG_THRESHOLD:
+        return "negative"
+    return "neutral"
+
+
+def sentiment_labels(compounds) -> List[str]:
+    """Vectorized sentiment_label over a sequence of compound scores."""
+    if np is None:
+        return [sentiment_label(c) for c in compounds]
+    c = np.asarray(compounds, dtype=float)
+    return np.where(c >= POS_THRESHOLD, "positive",
+                    np.where(c <= NEG_THRESHOLD, "negative", "neutral")).tolist()
+
+
+_NEUTRAL_SCORES = {"neg": 0.0, "neu": 1.0, "pos": 0.0, "compound": 0.0}
+# punctuation dropped from tokens before the lexicon lookup for top contributors
+_STRIP_TBL = str.maketrans("", "", ".,!?;:'\"()[]{}")
+
+
+def _lexicon_miss(lex, words: List[str]) -> bool:
+    """
+    True when VADER would give every word a valence of 0: no word, raw or punctuation-stripped,
+    is a lexicon entry, and at least one word is long enough for VADER to count. The scores are
+    then exactly neutral, so polarity_scores (and its per-call SentiText build) can be skipped.
+    """
+    counted = False
+    for w in words:
+        if w in lex or w.strip(string.punctuation) in lex:
+            return False
+        counted = counted or len(w) > 1
+    return counted
+
+
+def _vader_compute(sid, text: str):
+    lex = sid.lexicon
+    lowered = text.lower()
+    # token contributions via lexicon lookup (top contributors)
+    token_vals = [(t, lex[t]) for t in lowered.translate(_STRIP_TBL).split() if t in lex]
+    if not token_vals and _lexicon_miss(lex, lowered.split()):
+        return dict(_NEUTRAL_SCORES), []
+
+    scores = sid.polarity_scores(text)
+    top = heapq.nlargest(8, token_vals, key=lambda x: abs(x[1]))
+    return scores, [{"token": k, "value": v} for k, v in top]
+
+
+# VADER results keyed by text_hash(text); assumes a single analyzer/lexicon per process
+_VADER_CACHE: Dict[bytes, Any] = {}
+_VADER_CACHE_MAX = 200_000
+
+
+def vader_scores(sid, text: str):
+    """VADER polarity scores and top lexicon tokens for `text`, without the label."""
     if not text or not str(text).strip():
-        scores = {"neg": 0.0, "neu": 1.0, "pos": 0.0, "compound": 0.0}
-        return "neutral", scores, []
-    scores = sid.polarity_scores(str(text))
-    comp = scores.get("compound", 0.0)
-    if comp >= 0.05:
-        label = "positive"
-    elif comp <= -0.05:
-        label = "negative"
-    else:
-        label = "neutral"
+        return dict(_NEUTRAL_SCORES), []
+    text = str(text)
+    key = text_hash(text)
+    cached = _VADER_CACHE.get(key)
+    if cached is None:
+        cached = _vader_compute(sid, text)
+        if len(_VADER_CACHE) >= _VADER_CACHE_MAX:
+            _VADER_CACHE.clear()
+        _VADER_CACHE[key] = cached
+    scores, tokens = cached
+    return dict(scores), list(tokens)
 
-    # token contributions via lexicon lookup (top contributors)
-    tokens: List[Dict[str, Any]] = []
-    try:
-        lex = getattr(sid, "lexicon", {}) or {}
-        token_vals = []
-        for t in str(text).split():
-            tt = t.lower().strip(".,!?;:'\"()[]{}")
-            if tt in lex:
-                token_vals.append((tt, lex[tt]))
-        token_vals = sorted(token_vals, key=lambda x: -abs(x[1]))[:8]
-        tokens = [{"token": k, "value": v} for k, v in token_vals]
-    except Exception:
-        tokens = []
 
-    return label, scores, tokens
+def sentiment_vader(sid, text: str):
+    scores, tokens = vader_scores(sid, text)
+    return sentiment_label(scores.get("compound", 0.0)), scores, tokens
+
+
+# Per-process state, set by _init_worker in each Pool worker
+_worker_sid = None
+_worker_short_lang = None
+_worker_detect_lang = True
+
+
+def _init_worker(short_lang=None, detect_lang=True):
+    global _worker_sid, _worker_short_lang, _worker_detect_lang
+    _worker_sid = SentimentIntensityAnalyzer()
+    _worker_short_lang = short_lang
+    _worker_detect_lang = detect_lang
+
+
+def _score_one(text: str, sid=None, short_lang=None, detect_lang=None):
+    short_lang = short_lang or _worker_short_lang
+    detect_lang = _worker_detect_lang if detect_lang is None else detect_lang
+    if not detect_lang:
+        lang = None
+    elif short_lang and text.strip() and len(text) < SHORT_TEXT_LEN:
+        lang = short_lang
+    else:
+        lang = detect_language(text)
+    scores, tokens = vader_scores(sid or _worker_sid, text)
+    return lang, scores, tokens
+
+
+def score_texts(sid, texts: List[str], workers: int = 1, short_lang=None, detect_lang=True):
+    """
+    Run language detection + VADER over `texts`, on `workers` processes when > 1 and there are at least
+    POOL_MIN_TEXTS texts (order preserved).
+    Texts shorter than SHORT_TEXT_LEN are assigned `short_lang` (when given) without detection;
+    with detect_lang=False the language is left as None for the caller to fill in.
+    Returns (language, scores, tokens) tuples; labels are assigned in bulk with sentiment_labels().
+    """
+    if workers <= 1 or len(texts) < POOL_MIN_TEXTS:
+        return [_score_one(t, sid, short_lang, detect_lang) for t in texts]
+    chunksize = max(1, len(texts) // (workers * 4))
+    with Pool(workers, initializer=_init_worker, initargs=(short_lang, detect_lang)) as pool:
+        return pool.map(_score_one, texts, chunksize=chunksize)
 
 
 def connect_mongo(uri: str):
@@ -114,25 +321,59 @@ def connect_mongo(uri: str):
     return client
 
 
-def process_from_csv(sid, force=False, sample=None, upsert=False):
+def flush_bulk(coll, ops) -> int:
+    """Send `ops` as one unordered bulk_write; return the number of documents matched or upserted."""
+    try:
+        res = coll.bulk_write(ops, ordered=False)
+        return res.matched_count + res.upserted_count
+    except BulkWriteError as e:
+        details = e.details
+        errors = details.get("writeErrors", [])
+        logger.warning(f"{len(errors)} failed writes in batch, e.g. {errors[:3]}")
+        return details.get("nMatched", 0) + details.get("nUpserted", 0)
+
+
+def process_from_csv(sid, force=False, sample=None, upsert=False, workers=1, short_fallback=True):
     if pd is None:
         raise RuntimeError("pandas not installed. Install with: pip install pandas")
-    if not CLEAN_CSV.exists():
-        raise FileNotFoundError(f"{CLEAN_CSV} not found. Run preprocess.py first.")
-    df = pd.read_csv(CLEAN_CSV, encoding="utf-8", low_memory=False)
+    df = read_clean_dataset()
     if sample:
         df = df.head(sample)
 
+    texte_col = df["texte"].fillna("").astype(str)
+    texts = texte_col.tolist()
+    # score each distinct non-blank text once, then fan results back out to the rows;
+    # blank texts are masked out up front and get the default result below
+    unique = texte_col[texte_col.str.strip().ne("")].drop_duplicates().tolist()
+    if _lid() is not None:
+        # fastText: one batched predict over the column, workers only run VADER
+        langs = detect_languages_batch(unique)
+        scored_unique = [(lang, scores, tokens) for lang, (_, scores, tokens)
+                         in zip(langs, score_texts(sid, unique, workers=workers, detect_lang=False))]
+    else:
+        short_lang = majority_language(unique) if short_fallback else None
+        if short_lang:
+            logger.info(f"Texts shorter than {SHORT_TEXT_LEN} chars are tagged with majority language '{short_lang}'")
+        scored_unique = score_texts(sid, unique, workers=workers, short_lang=short_lang)
+    labels_unique = sentiment_labels([scores.get("compound", 0.0) for _, scores, _ in scored_unique])
+    by_text = {t: (lang, label, scores, tokens)
+               for t, (lang, scores, tokens), label in zip(unique, scored_unique, labels_unique)}
+    empty_result = ("unknown", "neutral", dict(_NEUTRAL_SCORES), [])
+    scored = [by_text.get(t, empty_result) for t in texts]
+
+    def column(name):
+        return df[name].tolist() if name in df.columns else [None] * len(df)
+
+    # pull columns out once instead of boxing every row as a Series
+    ids, types, labels, hashes = column("id_post"), column("Type"), column("Label"), df["text_hash"].tolist()
     results = []
-    for _, row in df.iterrows():
-        texte = row.get("texte", "") or ""
-        lang = detect_language(texte)
-        sentiment, scores, tokens = sentiment_vader(sid, texte)
+    for i, (texte, (lang, sentiment, scores, tokens)) in enumerate(zip(texts, scored)):
         doc = {
-            "id_post": int(row.get("id_post")) if pd.notna(row.get("id_post")) else None,
+            "id_post": int(ids[i]) if pd.notna(ids[i]) else None,
             "texte": texte,
-            "Type": row.get("Type"),
-            "Label": row.get("Label"),
+            "Type": types[i],
+            "Label": labels[i],
+            "text_hash": hashes[i],
             "language": lang,
             "sentiment": sentiment,
             "sentiment_scores": scores,
@@ -145,10 +386,15 @@ def process_from_csv(sid, force=False, sample=None, upsert=False):
         db = client[MONGO_DB]
         coll = db[MONGO_COLL]
         count = 0
+        ops = []
         for r in results:
-            key = {"id_post": r.get("id_post")} if r.get("id_post") is not None else {"texte": r.get("texte")}
-            coll.replace_one(key, r, upsert=True)
-            count += 1
+            key = {"id_post": r.get("id_post")} if r.get("id_post") is not None else {"text_hash": r.get("text_hash")}
+            ops.append(UpdateOne(key, {"$set": r}, upsert=True))
+            if len(ops) >= BULK_BATCH:
+                count += flush_bulk(coll, ops)
+                ops = []
+        if ops:
+            count += flush_bulk(coll, ops)
         client.close()
         logger.info(f"{count} documents upserted into {MONGO_DB}.{MONGO_COLL}")
 
@@ -160,30 +406,39 @@ def process_from_mongo(sid, force=False, batch=500, sample=None):
     db = client[MONGO_DB]
     coll = db[MONGO_COLL]
 
-    cursor = coll.find({}, no_cursor_timeout=True).batch_size(batch)
+    # without --force, only fetch documents still missing an NLP field, and only the text
+    query = {} if force else {"$or": [{"language": {"$exists": False}}, {"sentiment": {"$exists": False}}]}
+    cursor = coll.find(query, projection={"texte": 1}, no_cursor_timeout=True).batch_size(batch)
     total = 0
     updated = 0
+    pending = []
+
+    def flush(pending):
+        labels = sentiment_labels([scores.get("compound", 0.0) for _, _, scores, _ in pending])
+        ops = [
+            UpdateOne({"_id": _id}, {"$set": {
+                "language": lang,
+                "sentiment": label,
+                "sentiment_scores": scores,
+                "sentiment_tokens": tokens,
+            }})
+            for (_id, lang, scores, tokens), label in zip(pending, labels)
+        ]
+        return flush_bulk(coll, ops)
+
     for doc in cursor:
         total += 1
         if sample and total > sample:
             break
-        need = force or ("language" not in doc) or ("sentiment" not in doc)
-        if not need:
-            continue
         texte = doc.get("texte", "") or ""
         lang = detect_language(texte)
-        sentiment, scores, tokens = sentiment_vader(sid, texte)
-        update = {
-            "language": lang,
-            "sentiment": sentiment,
-            "sentiment_scores": scores,
-            "sentiment_tokens": tokens,
-        }
-        try:
-            coll.update_one({"_id": doc["_id"]}, {"$set": update})
-            updated += 1
-        except Exception as e:
-            logger.warning(f"Error updating _id={doc.get('_id')}: {e}")
+        scores, tokens = vader_scores(sid, texte)
+        pending.append((doc["_id"], lang, scores, tokens))
+        if len(pending) >= BULK_BATCH:
+            updated += flush(pending)
+            pending = []
+    if pending:
+        updated += flush(pending)
 
     cursor.close()
     client.close()
@@ -199,6 +454,11 @@ def main():
     parser.add_argument("--sample", type=int, default=0, help="process only N documents (for testing)")
     parser.add_argument("--upsert", action="store_true",
                         help="when --source csv: upsert results to MongoDB after processing")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="when --source csv: number of processes used for scoring (default: 1)")
+    parser.add_argument("--no-short-fallback", action="store_true",
+                        help=f"when --source csv: run language detection on texts under {SHORT_TEXT_LEN} chars "
+                             "instead of using the majority language")
     args = parser.parse_args()
 
     try:
@@ -208,7 +468,8 @@ def main():
         return
 
     if args.source == "csv":
-        results = process_from_csv(sid, force=args.force, sample=(args.sample or None), upsert=args.upsert)
+        results = process_from_csv(sid, force=args.force, sample=(args.sample or None), upsert=args.upsert,
+                                   workers=args.workers, short_fallback=not args.no_short_fallback)
         logger.info(f"{len(results)} rows processed from CSV")
     else:
         stats = process_from_mongo(sid, force=args.force, batch=args.batch, sample=(args.sample or None))
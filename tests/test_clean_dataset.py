@@ -0,0 +1,52 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import clean_dataset  # noqa: E402
+from clean_dataset import COLUMNS, read_clean_dataset, text_hash  # noqa: E402
+
+# a cleaned file as written before text_hash existed, with an extra raw column preprocess.py carries over
+OLD = pd.DataFrame({
+    "id_post": [1, 2], "texte": ["hello", "bonjour"], "Type": ["t", "t"], "Label": ["a", "b"], "extra": [0, 0],
+})
+HASHES = [text_hash("hello"), text_hash("bonjour")]
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(clean_dataset, "CLEAN_PARQUET", tmp_path / "clean.parquet")
+    monkeypatch.setattr(clean_dataset, "CLEAN_CSV", tmp_path / "clean.csv")
+    return clean_dataset.CLEAN_PARQUET, clean_dataset.CLEAN_CSV
+
+
+def test_text_hash_is_blake2b_128():
+    assert text_hash("hello") == bytes.fromhex("46fb7408d4f285228f4af516ea25851b")
+
+
+@pytest.mark.parametrize("with_hash", [False, True])
+def test_reads_parquet(paths, with_hash):
+    pytest.importorskip("pyarrow")
+    df = OLD.assign(text_hash=HASHES) if with_hash else OLD
+    df.to_parquet(paths[0], index=False)
+    out = read_clean_dataset()
+    assert list(out.columns) == COLUMNS
+    assert out["text_hash"].tolist() == HASHES
+
+
+@pytest.mark.parametrize("with_hash", [False, True])
+def test_reads_csv(paths, with_hash):
+    # preprocess.py stores text_hash as hex in the CSV fallback
+    df = OLD.assign(text_hash=[h.hex() for h in HASHES]) if with_hash else OLD
+    df.to_csv(paths[1], index=False)
+    out = read_clean_dataset()
+    assert list(out.columns) == COLUMNS
+    assert out["text_hash"].tolist() == HASHES
+
+
+def test_missing_files(paths):
+    with pytest.raises(FileNotFoundError):
+        read_clean_dataset()
@@ -0,0 +1,50 @@
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+pytest.importorskip("nltk")
+from nltk.sentiment import SentimentIntensityAnalyzer  # noqa: E402
+
+from nlp_pipeline import _NEUTRAL_SCORES, _vader_compute  # noqa: E402
+
+try:
+    SID = SentimentIntensityAnalyzer()
+except LookupError:
+    pytest.skip("nltk vader_lexicon not downloaded", allow_module_level=True)
+
+# words VADER gives no valence on their own (or only through rules: boosters, negations, "but", idiom parts)
+NEUTRAL_WORDS = [
+    "the", "of", "to", "is", "qwzx", "blorp", "I", "a", "x", "b", "very", "kind", "not", "never", "but",
+    "least", "no", "yeah", "right", "kiss", "cut", "mustard", "hand", "mouth", "back", "handed",
+    "!", "!!!", "?", "???", "...", ",", "'", "-", "HELLO", "WOW", "OMG", "#love", "*hate*", "~good~", "@bad",
+]
+# lexicon entries, including emoticons and words that only match once punctuation is stripped
+LEXICON_WORDS = [
+    "good", "bad", "love", "hate", ":)", ":-(", "<3", ":D", "lol", "death", "bomb", "die", "great!", "(sad)",
+    "ass", "heart", "beating", "GREAT", "Nice,", "kind,", "no.", "-good", "hate-", "-love!",
+]
+
+
+@pytest.mark.parametrize("text", [
+    "a b c", "I x", "qwzx blorp", "the of to", "!!!", "??? !", "HELLO THERE", "very not",
+    "kiss of death", "yeah right", "the bomb", "cut the mustard", "hand to mouth", "back handed", "to die for",
+    ":)", "hi:)", ":-( ok", "<3", "lol!!!", "not bad", "good, but bad", "GREAT!!!", "x :D", "kind of great",
+    "#love it", "so *hate* this", "the ~good~ one", "so -good", "hate- it",
+])
+def test_vader_compute_matches_polarity_scores(text):
+    assert _vader_compute(SID, text)[0] == SID.polarity_scores(text)
+
+
+def test_vader_compute_short_circuit_is_exact():
+    rng = random.Random(0)
+    words = NEUTRAL_WORDS * 3 + LEXICON_WORDS
+    texts = [" ".join(rng.choice(words) for _ in range(rng.randint(1, 8))) for _ in range(20_000)]
+    mismatches = [(t, _vader_compute(SID, t)[0], SID.polarity_scores(t)) for t in texts
+                  if _vader_compute(SID, t)[0] != SID.polarity_scores(t)]
+    assert mismatches[:5] == []
+    # the fast path must actually be exercised, not just the polarity_scores fallback
+    assert sum(_vader_compute(SID, t) == (_NEUTRAL_SCORES, []) for t in texts) > 1000
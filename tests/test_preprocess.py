@@ -0,0 +1,68 @@
+import random
+import re
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+import preprocess  # noqa: E402
+from preprocess import clean_texts  # noqa: E402
+
+# Original sequential cleaning: each pattern substituted in turn over the whole string
+_url_re = re.compile(r"https?://\S+|www\.\S+", flags=re.IGNORECASE)
+_email_re = re.compile(r"\S+@\S+\.\S+", flags=re.IGNORECASE)
+_ctrl_re = re.compile(r"[\r\n\t]+")
+_multi_space_re = re.compile(r"\s{2,}")
+
+
+def sequential_clean(s):
+    s = _url_re.sub(" ", s)
+    s = _email_re.sub(" ", s)
+    s = _ctrl_re.sub(" ", s)
+    s = _multi_space_re.sub(" ", s)
+    return s.strip()
+
+
+TOKENS = [
+    "a", "x", "ok", " ", "  ", "\t", "\n", "\r", "\xa0", " ", "　", "\x0b", "\x0c",
+    "\x1c", "\x85", " ", " ", " ",
+    "http://", "https://", "HTTP://", "www.", "WWW.", "t.co/x", "ttp", "h", "w",
+    ".", "@", ":", "/", "#tag", "@user", "me@x.com",
+]
+
+
+@pytest.fixture(autouse=True, params=["re2", "re"])
+def engine(request, monkeypatch):
+    """Run every test on pyarrow strings (Arrow's RE2 engine) and on object strings (Python's re)."""
+    if request.param == "re2":
+        pytest.importorskip("pyarrow")
+        monkeypatch.setattr(preprocess, "_TEXT_DTYPE", pd.StringDtype("pyarrow"))
+    else:
+        monkeypatch.setattr(preprocess, "_TEXT_DTYPE", object)
+    return request.param
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("x@userhttp://t.co/a ok", "x@user ok"),
+    ("love\xa0\xa0you", "love you"),
+    ("see http://t.co/x\xa0great stuff", "see great stuff"),
+    ("mail me@x.com or www.site.org\tnow", "mail or now"),
+    ("  a\r\n\tb  ", "a b"),
+])
+def test_clean_texts_examples(raw, expected):
+    assert clean_texts(pd.Series([raw])).tolist() == [expected]
+
+
+def test_clean_texts_matches_sequential_clean():
+    rng = random.Random(0)
+    texts = ["".join(rng.choice(TOKENS) for _ in range(rng.randint(0, 12))) for _ in range(50_000)]
+    cleaned = clean_texts(pd.Series(texts)).tolist()
+    mismatches = [(t, sequential_clean(t), c) for t, c in zip(texts, cleaned) if sequential_clean(t) != c]
+    assert mismatches[:5] == []
+
+
+def test_clean_texts_handles_missing_values():
+    assert clean_texts(pd.Series([None, float("nan"), " hi "])).tolist() == ["", "", "hi"]